@@ -8,6 +8,7 @@ import base64
 import io
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Optional
 
@@ -17,6 +18,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configure logging
 logging.basicConfig(
@@ -34,6 +37,7 @@ SCOPES = [
 # Configuration
 GMAIL_KEYWORD = 'KMRL'  # Search keyword
 POLL_INTERVAL = 60  # seconds
+ATTACHMENT_UPLOAD_WORKERS = 4  # concurrent attachment uploads per email
 BACKEND_URL = 'http://localhost:8000'
 TOKEN_PATH = 'gmail_token.json'
 CREDENTIALS_PATH = 'gmail_credentials.json'
@@ -63,6 +67,16 @@ class GmailIngestionService:
     def __init__(self):
         self.service = None
         self.credentials = None
+        # Reuse backend connections across emails/attachments instead of reconnecting per request;
+        # the pool holds one connection per concurrent attachment upload. Retries cover failed
+        # connections only, where the request never reached the server, so nothing is uploaded twice
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=ATTACHMENT_UPLOAD_WORKERS,
+            max_retries=Retry(total=3, backoff_factor=0.2)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
     def authenticate(self) -> bool:
         """Authenticate with Gmail API"""
@@ -283,7 +297,7 @@ class GmailIngestionService:
                 'message_id': email_metadata['message_id']
             }
             
-            response = requests.post(url, json=payload, timeout=30)
+            response = self.session.post(url, json=payload, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
@@ -318,7 +332,7 @@ class GmailIngestionService:
             if email_context and email_context.get('body'):
                 params['email_body'] = email_context['body'][:1000]  # First 1000 chars
             
-            response = requests.post(url, files=files, params=params, timeout=30)
+            response = self.session.post(url, files=files, params=params, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
@@ -383,25 +397,35 @@ class GmailIngestionService:
         logger.info(f"📎 Found {len(attachments)} document(s)")
         
         # Step 3: Process each attachment with email context
+        # The Gmail client isn't thread-safe, so downloads stay on this thread; the backend
+        # uploads (where parsing/OCR/classification happen) run concurrently meanwhile
+        uploads = []
+        with ThreadPoolExecutor(max_workers=min(ATTACHMENT_UPLOAD_WORKERS, len(attachments))) as executor:
+            for attachment_info in attachments:
+                logger.info(f"\n  Processing: {attachment_info['filename']}")
+                
+                # Download attachment
+                file_data = self.download_attachment(
+                    attachment_info['message_id'],
+                    attachment_info['attachment_id']
+                )
+                
+                if not file_data:
+                    logger.error(f"  ❌ Failed to download")
+                    continue
+                
+                # Upload to backend with email context
+                uploads.append((
+                    attachment_info,
+                    executor.submit(self.upload_to_backend, attachment_info, file_data, email_context=metadata)
+                ))
+        
         success_count = 0
-        for attachment_info in attachments:
-            logger.info(f"\n  Processing: {attachment_info['filename']}")
-            
-            # Download attachment
-            file_data = self.download_attachment(
-                attachment_info['message_id'],
-                attachment_info['attachment_id']
-            )
-            
-            if not file_data:
-                logger.error(f"  ❌ Failed to download")
-                continue
-            
-            # Upload to backend with email context
-            if self.upload_to_backend(attachment_info, file_data, email_context=metadata):
+        for attachment_info, upload in uploads:
+            if upload.result():
                 success_count += 1
             else:
-                logger.error(f"  ❌ Failed to upload")
+                logger.error(f"  ❌ Failed to upload: {attachment_info['filename']}")
         
         # Mark email as read
         self.mark_as_read(message_id)
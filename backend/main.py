@@ -3,6 +3,11 @@ FastAPI Backend for Doc.X-Intelligent
 Handles document processing, storage, embedding generation, and RAG-based classification
 """
 import os
+import re
+import time
+import uuid
+import base64
+import asyncio
 import logging
 from dotenv import load_dotenv
 
@@ -11,13 +16,14 @@ load_dotenv()
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, RedirectResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterable, Tuple
+from datetime import datetime, timedelta, timezone
+from collections import Counter, OrderedDict, defaultdict
 
-from services.storage_service import StorageService
-from services.document_parser import DocumentParser
+from services.storage_service import StorageService, resolve_content_type
+from services.document_parser import DocumentParser, calculate_content_hash
 from services.embedding_service import EmbeddingService
 from services.department_classifier import DepartmentClassifier
 from services.database_service import DatabaseService
@@ -33,7 +39,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Doc.X-Intelligent API",
     description="Intelligent document processing and classification system",
-    version="2.0.0"
+    version="2.0.0",
+    # orjson serializes the (often large) document listings much faster than stdlib json
+    default_response_class=ORJSONResponse
 )
 
 # CORS configuration
@@ -45,6 +53,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Priority buckets reported by the stats endpoints
+PRIORITY_LEVELS = ('urgent', 'high', 'normal', 'low')
+
+# Chat messages containing any of these are treated as document searches; compiled into
+# one pattern so a message is scanned once rather than once per keyword
+SEARCH_INTENT_KEYWORDS = ('search', 'find', 'look for', 'show me', 'get', 'document about', 'documents about')
+SEARCH_INTENT_PATTERN = re.compile("|".join(re.escape(keyword) for keyword in SEARCH_INTENT_KEYWORDS))
+
+# Lead-in phrases stripped from a search message to get the query, tried in order
+SEARCH_QUERY_PREFIXES = ('search for', 'find', 'look for', 'show me', 'get documents about', 'find documents about')
+
+# Largest page /api/documents/all will return; clients page through with offset
+MAX_DOCUMENTS_PAGE_SIZE = 500
+
+# Uploads are read in chunks and rejected past this size, so an oversized file can't
+# exhaust worker memory before it is refused
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "50")) * 1024 * 1024
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
+
+# Analyses of recently re-uploaded content, keyed by content hash, so repeat duplicates
+# skip the database and vector store lookups too
+DUPLICATE_CACHE_SIZE = 256
+_duplicate_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# The dashboard polls the overview on every refresh; recompute it at most this often
+# per worker (uploads and deletes through this worker reset it immediately)
+OVERVIEW_STATS_TTL = 30  # seconds
+_overview_stats_cache: List[Any] = [0.0, None]  # [computed at (monotonic), stats]
+
 # Initialize services
 storage_service = StorageService()
 document_parser = DocumentParser()
@@ -148,6 +185,75 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+async def _read_upload(file: UploadFile) -> bytes:
+    """Read an uploaded file in chunks, rejecting it with 413 as soon as it exceeds MAX_UPLOAD_SIZE"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await file.read(UPLOAD_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large (limit {MAX_UPLOAD_SIZE // (1024 * 1024)} MB)"
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+async def _no_duplicate() -> None:
+    """Stand-in for _load_duplicate_analysis when deduplication doesn't apply"""
+    return None
+
+async def _load_duplicate_analysis(content_hash: str) -> Optional[Dict[str, Any]]:
+    """Return the stored analysis of an earlier upload with identical content, if any"""
+    cached = _duplicate_cache.get(content_hash)
+    if cached is not None:
+        _duplicate_cache.move_to_end(content_hash)
+        return cached
+    
+    try:
+        existing = await database_service.get_document_by_content_hash(content_hash)
+        # Zero confidence marks a failed classification - don't propagate it
+        if not existing or not existing.get('vector_id') or not existing.get('confidence'):
+            return None
+        
+        # An 'assign' upload stores the user's target department, not the classifier's
+        if existing.get('task_type') == 'assign':
+            return None
+        
+        # Email attachments were embedded and classified together with their email's text,
+        # so their analysis doesn't describe the file on its own (rows stored before such
+        # uploads stopped recording content_hash)
+        if existing.get('email_subject') or existing.get('email_from'):
+            return None
+        
+        stored = await embedding_service.get_embedding(existing['vector_id'])
+        if not stored:
+            return None
+        
+        analysis = {
+            "document_id": existing['id'],
+            "embedding": stored['embedding'],
+            "content_preview": stored['metadata'].get('content_preview', ''),
+            "classification": {
+                "department": existing['department'],
+                "summary": existing.get('summary') or '',
+                "confidence": existing.get('confidence') or 0.0
+            }
+        }
+        
+        _duplicate_cache[content_hash] = analysis
+        if len(_duplicate_cache) > DUPLICATE_CACHE_SIZE:
+            _duplicate_cache.popitem(last=False)
+        
+        return analysis
+    except Exception as e:
+        # Dedup is an optimization only - fall back to full processing
+        logger.warning(f"⚠️ Duplicate lookup failed, processing normally: {e}")
+        return None
+
 @app.post("/api/documents/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
@@ -175,44 +281,59 @@ async def upload_document(
         logger.info(f"📄 Processing document: {file.filename}")
         
         # Read file content
-        file_content = await file.read()
+        file_content = await _read_upload(file)
         file_size = len(file_content)
-        
-        # Store in MinIO
-        object_path = await storage_service.upload_document(
-            filename=file.filename,
-            content=file_content,
-            content_type=file.content_type
+        content_hash = calculate_content_hash(file_content)
+        
+        # Resolved once so storage and the documents row record the same type
+        content_type = resolve_content_type(file.filename, file.content_type)
+        
+        # Store in MinIO while looking for an earlier upload with identical bytes; if there
+        # is one, reuse its analysis instead of re-running parse/embed/classify (email
+        # context changes the input, so only without it)
+        object_path, duplicate = await asyncio.gather(
+            storage_service.upload_document(
+                filename=file.filename,
+                content=file_content,
+                content_type=content_type
+            ),
+            _no_duplicate() if email_body else _load_duplicate_analysis(content_hash)
         )
         logger.info(f"✅ Stored in MinIO: {object_path}")
         
-        # Parse document content
-        parsed_content = await document_parser.parse_document(
-            filename=file.filename,
-            content=file_content
-        )
-        logger.info(f"✅ Parsed {len(parsed_content)} characters")
-        
-        # Combine document content with email body context if available
-        combined_content = parsed_content
-        if email_body:
-            combined_content = f"Email Context:\n{email_subject or ''}\n{email_body[:1000]}\n\nDocument Content:\n{parsed_content}"
-            logger.info(f"✅ Combined with email context")
-        
-        # Generate embeddings from combined content
-        embedding = await embedding_service.generate_embedding(combined_content)
-        logger.info(f"✅ Generated embedding")
-        
-        # Classify department and generate summary using RAG
-        classification_result = await department_classifier.classify_and_summarize(
-            content=combined_content,
-            embedding=embedding,
-            filename=file.filename
-        )
+        if duplicate:
+            logger.info(f"♻️ Identical content already processed, reusing analysis of {duplicate['document_id']}")
+            parsed_content = duplicate['content_preview']
+            embedding = duplicate['embedding']
+            classification_result = duplicate['classification']
+        else:
+            # Parse document content
+            parsed_content = await document_parser.parse_document(
+                filename=file.filename,
+                content=file_content,
+                content_hash=content_hash
+            )
+            logger.info(f"✅ Parsed {len(parsed_content)} characters")
+            
+            # Combine document content with email body context if available
+            combined_content = parsed_content
+            if email_body:
+                combined_content = f"Email Context:\n{email_subject or ''}\n{email_body[:1000]}\n\nDocument Content:\n{parsed_content}"
+                logger.info(f"✅ Combined with email context")
+            
+            # Generate embeddings and classify department / summarize; the classifier
+            # prompts on the text alone, so the two API calls run concurrently
+            embedding, classification_result = await asyncio.gather(
+                embedding_service.generate_embedding(combined_content),
+                department_classifier.classify_and_summarize(
+                    content=combined_content,
+                    filename=file.filename
+                )
+            )
+            logger.info(f"✅ Generated embedding")
         logger.info(f"✅ Classified: {classification_result['department']} (confidence: {classification_result['confidence']})")
         
         # Generate document_id upfront to use in both ChromaDB and Supabase
-        import uuid
         document_id = str(uuid.uuid4())
         
         # Store in vector database (filter out None values for ChromaDB)
@@ -242,8 +363,10 @@ async def upload_document(
             "department": target_department if task_type == 'assign' and target_department else classification_result['department'],
             "summary": classification_result['summary'],
             "confidence": classification_result['confidence'],
-            "file_type": file.content_type or "application/octet-stream",
+            "file_type": content_type,
             "file_size": file_size,
+            # The analysis above mixed in the email's text, so it must not be reused for these bytes
+            "content_hash": None if email_body else content_hash,
             "user_id": user_id,
             "source": source,
             "vector_id": vector_id,
@@ -277,6 +400,7 @@ async def upload_document(
         #     document_metadata["description"] = description
         
         await database_service.store_document_metadata(document_metadata)
+        _overview_stats_cache[1] = None
         logger.info(f"✅ Document processed: {document_id}")
         
         return DocumentUploadResponse(
@@ -289,6 +413,8 @@ async def upload_document(
             metadata=document_metadata
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error processing document: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -308,16 +434,15 @@ async def process_email(email_request: EmailProcessRequest):
         # Clean and prepare email content
         email_content = f"Subject: {email_request.email_subject}\n\n{email_request.email_body}"
         
-        # Generate embeddings
-        embedding = await embedding_service.generate_embedding(email_content)
-        logger.info(f"✅ Generated email embedding")
-        
-        # Classify department and generate summary
-        classification_result = await department_classifier.classify_and_summarize(
-            content=email_content,
-            embedding=embedding,
-            filename=f"Email: {email_request.email_subject}"
+        # Generate embeddings and classify department / summarize concurrently
+        embedding, classification_result = await asyncio.gather(
+            embedding_service.generate_embedding(email_content),
+            department_classifier.classify_and_summarize(
+                content=email_content,
+                filename=f"Email: {email_request.email_subject}"
+            )
         )
+        logger.info(f"✅ Generated email embedding")
         logger.info(f"✅ Classified: {classification_result['department']}")
         
         # Store in vector database
@@ -361,23 +486,27 @@ async def process_email(email_request: EmailProcessRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/documents/all")
-async def get_all_documents(user_email: Optional[str] = None):
-    """Get all non-private documents"""
+async def get_all_documents(user_email: Optional[str] = None, limit: int = 100, offset: int = 0):
+    """Get a page of non-private documents, newest first"""
     try:
+        limit = max(1, min(limit, MAX_DOCUMENTS_PAGE_SIZE))
+        offset = max(0, offset)
+        
         # Get only public documents or user's private documents
+        query = database_service.client.table("documents").select("*")
         if user_email:
-            docs = database_service.client.table("documents")\
-                .select("*")\
-                .or_(f"is_private.eq.false,owner_email.eq.{user_email}")\
-                .execute()
+            query = query.or_(f"is_private.eq.false,owner_email.eq.{user_email}")
         else:
-            docs = database_service.client.table("documents")\
-                .select("*")\
-                .eq("is_private", False)\
-                .execute()
+            query = query.eq("is_private", False)
+        
+        docs = query.order("upload_date", desc=True)\
+            .range(offset, offset + limit - 1)\
+            .execute()
         
         return {
-            "documents": docs.data
+            "documents": docs.data,
+            "limit": limit,
+            "offset": offset
         }
     except Exception as e:
         logger.error(f"❌ Error: {e}")
@@ -397,16 +526,17 @@ async def search_documents(search_request: SearchRequest, user_email: Optional[s
             limit=search_request.limit
         )
         
-        # Enrich results with full document metadata from database
+        # Enrich results with document metadata from database (one batched query; private
+        # documents are excluded unless owned by current user)
+        metadata_by_id = await database_service.get_visible_documents_metadata(
+            [result['document_id'] for result in results],
+            user_email=user_email
+        )
+        
         enriched_results = []
         for result in results:
-            # Get full document metadata
-            doc_metadata = await database_service.get_document_metadata(result['document_id'])
+            doc_metadata = metadata_by_id.get(result['document_id'])
             if doc_metadata:
-                # Exclude private documents unless owned by current user
-                if doc_metadata.get('is_private') and doc_metadata.get('owner_email') != user_email:
-                    continue
-                    
                 enriched_results.append({
                     "id": doc_metadata['id'],
                     "title": doc_metadata.get('filename', 'Untitled Document'),
@@ -481,33 +611,54 @@ async def get_department_documents(department: str, limit: int = 50):
 async def get_department_summary(department: str):
     """Get comprehensive summary stats for a department"""
     try:
-        documents = await database_service.get_documents_by_department(department, limit=1000)
-        
-        # Calculate statistics
-        total_docs = len(documents)
-        urgent_docs = sum(1 for d in documents if d.get('priority') == 'urgent')
-        high_docs = sum(1 for d in documents if d.get('priority') == 'high')
-        normal_docs = sum(1 for d in documents if d.get('priority') == 'normal')
-        
-        # Recent activity - last 7 days
-        from datetime import datetime, timedelta
-        now = datetime.utcnow()
-        seven_days_ago = now - timedelta(days=7)
+        # Aggregate in Postgres when the get_department_summary function is installed
+        try:
+            aggregates = await database_service.get_department_summary(department)
+        except Exception as rpc_error:
+            logger.warning(f"⚠️ get_department_summary function not found: {rpc_error}")
+            logger.info("Please run: database_metadata_schema.sql")
+            aggregates = None
+        
+        if aggregates:
+            total_docs = aggregates['total_documents']
+            priority_counts = Counter(aggregates.get('priority_counts') or {})
+            status_counts = Counter(aggregates.get('status_counts') or {})
+            recent_documents = aggregates.get('recent_documents') or []
+            weekly_documents = aggregates['weekly_documents']
+        else:
+            documents = await database_service.get_documents_by_department(department, limit=1000)
+            
+            # Calculate statistics
+            total_docs = len(documents)
+            priority_counts = Counter(d.get('priority') for d in documents)
+            status_counts = Counter(d.get('status') for d in documents)
+            recent_documents = documents[:5]
+            
+            # Recent activity - last 7 days
+            now = datetime.utcnow()
+            seven_days_ago = now - timedelta(days=7)
+            
+            weekly_documents = sum(
+                1 for d in documents
+                if datetime.fromisoformat(d.get('upload_date', d.get('created_at', '')).replace('Z', '')) > seven_days_ago
+            )
         
-        recent_docs = [d for d in documents if datetime.fromisoformat(d.get('upload_date', d.get('created_at', '')).replace('Z', '')) > seven_days_ago]
+        urgent_docs = priority_counts['urgent']
+        high_docs = priority_counts['high']
+        normal_docs = priority_counts['normal']
         
         return {
             "department": department,
             "total_documents": total_docs,
             "total_tasks": total_docs,
-            "pending_tasks": sum(1 for d in documents if d.get('status') == 'pending'),
-            "completed_tasks": sum(1 for d in documents if d.get('status') == 'completed'),
-            "overdue_tasks": sum(1 for d in documents if d.get('status') == 'overdue'),
+            "pending_tasks": status_counts['pending'],
+            "completed_tasks": status_counts['completed'],
+            "overdue_tasks": status_counts['overdue'],
             "urgent_count": urgent_docs,
             "high_count": high_docs,
             "normal_count": normal_docs,
             "recent_activity": [
-                f"Processed: {d.get('filename', 'Unknown')}" for d in documents[:5]
+                f"Processed: {d.get('filename', 'Unknown')}" for d in recent_documents
             ],
             "current_projects": [
                 f"{department} Document Management",
@@ -515,7 +666,7 @@ async def get_department_summary(department: str):
                 "System Optimization"
             ],
             "completed_activities": [
-                f"Processed {len(recent_docs)} documents this week",
+                f"Processed {weekly_documents} documents this week",
                 f"Classified {urgent_docs + high_docs} priority items",
                 f"Managed {total_docs} total documents"
             ],
@@ -524,8 +675,8 @@ async def get_department_summary(department: str):
                 "Processing incoming documents",
                 "Maintaining document database"
             ],
-            "recent_documents": documents[:5] if documents else [],
-            "weekly_documents": len(recent_docs)
+            "recent_documents": recent_documents,
+            "weekly_documents": weekly_documents
         }
     except Exception as e:
         logger.error(f"❌ Error retrieving department summary: {e}")
@@ -533,69 +684,118 @@ async def get_department_summary(department: str):
 
 @app.get("/api/stats/overview")
 async def get_overview_stats():
-    """Get overall system statistics"""
+    """Get overall system statistics (reused for OVERVIEW_STATS_TTL seconds)"""
+    cached_at, cached_stats = _overview_stats_cache
+    if cached_stats is not None and time.monotonic() - cached_at < OVERVIEW_STATS_TTL:
+        return cached_stats
+    
     try:
-        # Fetch all documents
-        all_docs_response = database_service.client.table("documents").select("*").limit(10000).execute()
-        all_docs = all_docs_response.data if all_docs_response.data else []
-        
-        # Calculate department breakdown
-        dept_breakdown = {}
-        for doc in all_docs:
-            dept = doc.get('department', 'Unknown')
-            if dept not in dept_breakdown:
-                dept_breakdown[dept] = {
-                    'total': 0,
-                    'urgent': 0,
-                    'high': 0,
-                    'normal': 0,
-                    'low': 0
-                }
-            dept_breakdown[dept]['total'] += 1
-            priority = doc.get('priority', 'normal')
-            if priority in dept_breakdown[dept]:
-                dept_breakdown[dept][priority] += 1
-        
-        # Recent activity - last 24 hours
-        from datetime import datetime, timedelta, timezone
-        now = datetime.now(timezone.utc)
-        twenty_four_hours_ago = now - timedelta(hours=24)
-        
-        recent_uploads = []
-        for d in all_docs:
-            try:
-                date_str = d.get('upload_date', d.get('created_at', ''))
-                if date_str:
-                    doc_date = datetime.fromisoformat(date_str.replace('Z', '+00:00').replace('+00:00+00:00', '+00:00'))
-                    if doc_date > twenty_four_hours_ago:
-                        recent_uploads.append(d)
-            except (ValueError, AttributeError):
-                # Skip documents with invalid dates
-                continue
+        stats = await _compute_overview_stats()
+    except Exception as e:
+        logger.error(f"❌ Error retrieving overview stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    _overview_stats_cache[:] = [time.monotonic(), stats]
+    return stats
+
+def _department_breakdown(rows: Iterable[Tuple[str, str, int]]) -> Dict[str, Dict[str, int]]:
+    """Tally (department, priority, count) rows into per-department totals and priority counts"""
+    counts: Dict[str, Counter] = defaultdict(Counter)
+    for department, priority, count in rows:
+        dept_counts = counts[department]
+        dept_counts['total'] += count
+        dept_counts[priority] += count
+    
+    # Report every known priority, including zeros; unknown priorities only count toward the total
+    return {
+        department: {
+            'total': dept_counts['total'],
+            **{priority: dept_counts[priority] for priority in PRIORITY_LEVELS}
+        }
+        for department, dept_counts in counts.items()
+    }
+
+async def _compute_overview_stats() -> Dict[str, Any]:
+    """Aggregate document counts for the overview, in Postgres when possible"""
+    # Aggregate in Postgres when the get_overview_stats function is installed
+    try:
+        aggregates = await database_service.get_overview_stats()
+    except Exception as rpc_error:
+        logger.warning(f"⚠️ get_overview_stats function not found: {rpc_error}")
+        logger.info("Please run: database_metadata_schema.sql")
+        aggregates = None
+    
+    if aggregates:
+        rows = aggregates.get('department_priority_counts') or []
+        dept_breakdown = _department_breakdown(
+            (row['department'], row['priority'], row['count']) for row in rows
+        )
+        priority_counts = Counter()
+        for row in rows:
+            priority_counts[row['priority']] += row['count']
         
         return {
-            "total_documents": len(all_docs),
+            "total_documents": aggregates['total_documents'],
             "total_departments": len(dept_breakdown),
             "department_stats": dept_breakdown,
-            "recent_uploads_24h": len(recent_uploads),
+            "recent_uploads_24h": aggregates['recent_uploads_24h'],
             "priority_distribution": {
-                "urgent": sum(d.get('priority') == 'urgent' for d in all_docs),
-                "high": sum(d.get('priority') == 'high' for d in all_docs),
-                "normal": sum(d.get('priority') == 'normal' for d in all_docs),
-                "low": sum(d.get('priority') == 'low' for d in all_docs)
+                priority: priority_counts[priority]
+                for priority in PRIORITY_LEVELS
             },
-            "sources": list(set(d.get('source', 'unknown') for d in all_docs)),
-            "active_users": len(set(d.get('user_id', 'anonymous') for d in all_docs))
+            "sources": aggregates.get('sources') or [],
+            "active_users": aggregates['active_users']
         }
-    except Exception as e:
-        logger.error(f"❌ Error retrieving overview stats: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    # Fallback for databases without the schema functions - and possibly without newer
+    # columns such as priority, so select * and read every field defensively
+    all_docs_response = database_service.client.table("documents")\
+        .select("*")\
+        .limit(10000)\
+        .execute()
+    all_docs = all_docs_response.data if all_docs_response.data else []
+    
+    # Calculate department breakdown
+    dept_breakdown = _department_breakdown(
+        (doc.get('department', 'Unknown'), doc.get('priority', 'normal'), 1) for doc in all_docs
+    )
+    
+    # Recent activity - last 24 hours
+    now = datetime.now(timezone.utc)
+    twenty_four_hours_ago = now - timedelta(hours=24)
+    
+    recent_uploads = []
+    for d in all_docs:
+        try:
+            date_str = d.get('upload_date', d.get('created_at', ''))
+            if date_str:
+                doc_date = datetime.fromisoformat(date_str.replace('Z', '+00:00').replace('+00:00+00:00', '+00:00'))
+                if doc_date > twenty_four_hours_ago:
+                    recent_uploads.append(d)
+        except (ValueError, AttributeError):
+            # Skip documents with invalid dates
+            continue
+    
+    priority_counts = Counter(d.get('priority') for d in all_docs)
+    
+    return {
+        "total_documents": len(all_docs),
+        "total_departments": len(dept_breakdown),
+        "department_stats": dept_breakdown,
+        "recent_uploads_24h": len(recent_uploads),
+        "priority_distribution": {
+            priority: priority_counts[priority]
+            for priority in PRIORITY_LEVELS
+        },
+        "sources": list(set(d.get('source', 'unknown') for d in all_docs)),
+        "active_users": len(set(d.get('user_id', 'anonymous') for d in all_docs))
+    }
 
 @app.get("/api/documents/{document_id}/download")
 async def download_document(document_id: str):
     """Generate download URL for document and redirect to it"""
     try:
-        metadata = await database_service.get_document_metadata(document_id)
+        metadata = await database_service.get_document_metadata(document_id, columns="object_path")
         if not metadata:
             raise HTTPException(status_code=404, detail="Document not found")
         
@@ -615,20 +815,28 @@ async def delete_document(document_id: str):
     """Delete a document from MinIO, vector DB, and database"""
     try:
         # Get document metadata
-        metadata = await database_service.get_document_metadata(document_id)
+        metadata = await database_service.get_document_metadata(
+            document_id,
+            columns="object_path, vector_id"
+        )
         if not metadata:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Delete from MinIO
-        await storage_service.delete_document(metadata['object_path'])
-        
-        # Delete from vector database
+        # Delete the stored file and its embedding concurrently; they don't depend on each other
+        deletions = [storage_service.delete_document(metadata['object_path'])]
         if 'vector_id' in metadata:
-            await embedding_service.delete_embedding(metadata['vector_id'])
+            deletions.append(embedding_service.delete_embedding(metadata['vector_id']))
+        await asyncio.gather(*deletions)
         
-        # Delete from database
+        # Delete from database last, so a failed cleanup above can be retried
         await database_service.delete_document_metadata(document_id)
         
+        # Don't hand this document's analysis to future identical uploads
+        for content_hash, analysis in list(_duplicate_cache.items()):
+            if analysis['document_id'] == document_id:
+                del _duplicate_cache[content_hash]
+        _overview_stats_cache[1] = None
+        
         return {"message": "Document deleted successfully", "document_id": document_id}
     except HTTPException:
         raise
@@ -649,42 +857,59 @@ async def n8n_webhook(
     Receives base64 encoded file content from N8N
     """
     try:
-        import base64
-        
         # Decode base64 content
         file_content = base64.b64decode(content)
-        
-        # Process similar to upload endpoint
-        object_path = await storage_service.upload_document(
-            filename=filename,
-            content=file_content,
-            content_type=content_type
-        )
-        
-        parsed_content = await document_parser.parse_document(
-            filename=filename,
-            content=file_content
+        content_hash = calculate_content_hash(file_content)
+        content_type = resolve_content_type(filename, content_type)
+        
+        # Process similar to upload endpoint; N8N retries resend the same file, so reuse
+        # the analysis of identical content instead of re-running parse/embed/classify
+        object_path, duplicate = await asyncio.gather(
+            storage_service.upload_document(
+                filename=filename,
+                content=file_content,
+                content_type=content_type
+            ),
+            _load_duplicate_analysis(content_hash)
         )
         
-        embedding = await embedding_service.generate_embedding(parsed_content)
+        if duplicate:
+            logger.info(f"♻️ Identical content already processed, reusing analysis of {duplicate['document_id']}")
+            parsed_content = duplicate['content_preview']
+            embedding = duplicate['embedding']
+            classification_result = duplicate['classification']
+        else:
+            parsed_content = await document_parser.parse_document(
+                filename=filename,
+                content=file_content,
+                content_hash=content_hash
+            )
+            
+            embedding, classification_result = await asyncio.gather(
+                embedding_service.generate_embedding(parsed_content),
+                department_classifier.classify_and_summarize(
+                    content=parsed_content,
+                    filename=filename
+                )
+            )
         
-        classification_result = await department_classifier.classify_and_summarize(
-            content=parsed_content,
-            embedding=embedding,
-            filename=filename
-        )
+        # Generate document_id upfront to use in both ChromaDB and Supabase
+        document_id = str(uuid.uuid4())
         
         vector_id = await embedding_service.store_embedding(
             embedding=embedding,
             metadata={
+                "document_id": document_id,
                 "filename": filename,
                 "object_path": object_path,
                 "department": classification_result['department'],
                 "content_preview": parsed_content[:500]
-            }
+            },
+            document_id=document_id
         )
         
         document_metadata = {
+            "id": document_id,
             "filename": filename,
             "object_path": object_path,
             "department": classification_result['department'],
@@ -692,6 +917,7 @@ async def n8n_webhook(
             "confidence": classification_result['confidence'],
             "file_type": content_type,
             "file_size": len(file_content),
+            "content_hash": content_hash,
             "source": source,
             "vector_id": vector_id,
             "upload_date": datetime.utcnow().isoformat(),
@@ -699,6 +925,7 @@ async def n8n_webhook(
         }
         
         document_id = await database_service.store_document_metadata(document_metadata)
+        _overview_stats_cache[1] = None
         
         return {
             "status": "success",
@@ -726,15 +953,14 @@ class AIChatResponse(BaseModel):
 async def ai_chat(chat_request: AIChatRequest):
     """AI assistant chat endpoint for document queries and analysis"""
     try:
-        import openai
-        from services.department_classifier import DepartmentClassifier
-        
-        classifier = DepartmentClassifier()
         message = chat_request.message.lower()
         
         # Handle document analysis request
         if chat_request.document_id:
-            metadata = await database_service.get_document_metadata(chat_request.document_id)
+            metadata = await database_service.get_document_metadata(
+                chat_request.document_id,
+                columns="filename, object_path, department, summary"
+            )
             if not metadata:
                 raise HTTPException(status_code=404, detail="Document not found")
             
@@ -759,8 +985,8 @@ Provide brief analysis:
 """
             
             try:
-                response = classifier.openai_client.chat.completions.create(
-                    model=classifier.model,
+                response = await department_classifier.openai_client.chat.completions.create(
+                    model=department_classifier.model,
                     messages=[
                         {"role": "system", "content": "You are a document analyst. Be concise and clear."},
                         {"role": "user", "content": analysis_prompt}
@@ -805,10 +1031,10 @@ Provide brief analysis:
             )
         
         # Handle document search request
-        elif any(keyword in message for keyword in ['search', 'find', 'look for', 'show me', 'get', 'document about', 'documents about']):
+        elif SEARCH_INTENT_PATTERN.search(message):
             # Extract search query
             search_query = chat_request.message
-            for phrase in ['search for', 'find', 'look for', 'show me', 'get documents about', 'find documents about']:
+            for phrase in SEARCH_QUERY_PREFIXES:
                 if phrase in message:
                     search_query = chat_request.message.split(phrase, 1)[-1].strip()
                     break
@@ -822,41 +1048,60 @@ Provide brief analysis:
             
             if results:
                 # Get full metadata for results
-                docs_with_urls = []
+                doc_ids = []
                 for result in results:
                     # Extract document_id (stored at top level during upload)
                     doc_id = result.get('document_id')
                     
                     if not doc_id:
-                        logger.warning(f"Search result missing document_id: {result}")
+                        logger.warning(f"Search result missing document_id: {result.get('id')}")
                         continue
                     
-                    logger.info(f"Processing search result with doc_id: {doc_id}")
+                    logger.debug(f"Processing search result with doc_id: {doc_id}")
+                    doc_ids.append(doc_id)
+                
+                try:
+                    metadata_by_id = await database_service.get_documents_metadata(doc_ids)
+                except Exception as e:
+                    logger.warning(f"Failed to get metadata for {doc_ids}: {e}")
+                    metadata_by_id = {}
+                
+                hits = [
+                    (result, metadata_by_id[result['document_id']])
+                    for result in results
+                    if result.get('document_id') in metadata_by_id
+                ]
+                
+                # Signed URLs are independent requests, so generate them concurrently
+                download_urls = await asyncio.gather(
+                    *(storage_service.generate_download_url(metadata['object_path']) for _, metadata in hits),
+                    return_exceptions=True
+                )
+                
+                docs_with_urls = []
+                for (result, metadata), download_url in zip(hits, download_urls):
+                    if isinstance(download_url, Exception):
+                        logger.warning(f"Failed to get download URL for {metadata['id']}: {download_url}")
+                        continue
                     
-                    if doc_id:
-                        try:
-                            metadata = await database_service.get_document_metadata(doc_id)
-                            if metadata:
-                                download_url = await storage_service.generate_download_url(metadata['object_path'])
-                                docs_with_urls.append({
-                                    **metadata,
-                                    "download_url": download_url,
-                                    "relevance_score": result.get('score', 0)
-                                })
-                        except Exception as e:
-                            logger.warning(f"Failed to get metadata for {doc_id}: {e}")
-                            continue
+                    docs_with_urls.append({
+                        **metadata,
+                        "download_url": download_url,
+                        "relevance_score": result.get('score', 0)
+                    })
                 
                 if docs_with_urls:
-                    response_text = f"🔍 **Found {len(docs_with_urls)} relevant document(s):**\n\n"
+                    response_parts = [f"🔍 **Found {len(docs_with_urls)} relevant document(s):**\n\n"]
                     for idx, doc in enumerate(docs_with_urls[:5], 1):
-                        response_text += f"**{idx}. {doc.get('filename', 'Unknown')}**\n"
-                        response_text += f"   📊 Department: {doc.get('department', 'Unknown')}\n"
-                        response_text += f"   📝 {doc.get('summary', 'No summary available')[:150]}...\n"
-                        response_text += f"   🎯 Relevance: {doc.get('relevance_score', 0):.2%}\n\n"
+                        response_parts.append(
+                            f"**{idx}. {doc.get('filename', 'Unknown')}**\n"
+                            f"   📊 Department: {doc.get('department', 'Unknown')}\n"
+                            f"   📝 {doc.get('summary', 'No summary available')[:150]}...\n"
+                            f"   🎯 Relevance: {doc.get('relevance_score', 0):.2%}\n\n"
+                        )
                     
                     return AIChatResponse(
-                        response=response_text,
+                        response="".join(response_parts),
                         documents=docs_with_urls[:5]
                     )
                 else:
@@ -890,7 +1135,7 @@ async def save_document_to_department(
     """Save/copy a document to a department's saved collection"""
     try:
         # Get document metadata
-        metadata = await database_service.get_document_metadata(document_id)
+        metadata = await database_service.get_document_metadata(document_id, columns="id")
         if not metadata:
             raise HTTPException(status_code=404, detail="Document not found")
         
@@ -954,7 +1199,7 @@ async def mark_document_private(document_id: str, user_email: str = Form(...)):
             .execute()
         
         logger.info(f"✅ Document {document_id} marked as private for {user_email}")
-        logger.info(f"Updated rows: {len(result.data) if result.data else 0}")
+        logger.debug(f"Updated rows: {len(result.data) if result.data else 0}")
         
         return {
             "message": "Document marked as private",
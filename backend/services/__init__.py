@@ -1,14 +1,18 @@
 # Services package
-from .storage_service import StorageService
-from .document_parser import DocumentParser
+from .storage_service import StorageService, resolve_content_type
+from .document_parser import DocumentParser, calculate_content_hash
 from .embedding_service import EmbeddingService
 from .department_classifier import DepartmentClassifier
 from .database_service import DatabaseService
+from .supabase_client import get_supabase_client
 
 __all__ = [
     'StorageService',
+    'resolve_content_type',
     'DocumentParser',
+    'calculate_content_hash',
     'EmbeddingService',
     'DepartmentClassifier',
-    'DatabaseService'
+    'DatabaseService',
+    'get_supabase_client'
 ]
@@ -3,22 +3,18 @@ Database Service
 Handles document metadata storage in Supabase
 Stores only metadata, not actual file content
 """
-import os
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
-from supabase import create_client, Client
+from supabase import Client
+from postgrest.types import ReturnMethod
+from .supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
 class DatabaseService:
     def __init__(self):
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
-        
-        if not supabase_url or not supabase_key:
-            raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables are required")
-        
-        self.client: Client = create_client(supabase_url, supabase_key)
+        self.client: Client = get_supabase_client()
         self.table_name = "documents"
         self.email_table_name = "emails"
         
@@ -27,7 +23,28 @@ class DatabaseService:
     async def store_document_metadata(self, metadata: Dict[str, Any]) -> str:
         """Store document metadata in Supabase"""
         try:
-            result = self.client.table(self.table_name).insert(metadata).execute()
+            return await self._insert_document_metadata(metadata)
+        except Exception as column_error:
+            # content_hash column doesn't exist yet - store the row without it
+            if 'content_hash' not in metadata or 'content_hash' not in str(column_error):
+                raise
+            logger.warning(f"⚠️ content_hash column not found: {column_error}")
+            logger.info("Please run: database_metadata_schema.sql")
+            metadata = {key: value for key, value in metadata.items() if key != 'content_hash'}
+            return await self._insert_document_metadata(metadata)
+    
+    async def _insert_document_metadata(self, metadata: Dict[str, Any]) -> str:
+        """Insert one documents row and return its ID"""
+        try:
+            # Caller already chose the ID: don't have PostgREST send the whole row back
+            if metadata.get('id'):
+                query = self.client.table(self.table_name).insert(metadata, returning=ReturnMethod.minimal)
+                await asyncio.to_thread(query.execute)
+                logger.info(f"✅ Stored metadata: {metadata['id']}")
+                return str(metadata['id'])
+            
+            # Blocking HTTP call; run it in a thread so other requests proceed meanwhile
+            result = await asyncio.to_thread(self.client.table(self.table_name).insert(metadata).execute)
             
             if result.data and len(result.data) > 0:
                 document_id = result.data[0].get('id')
@@ -56,12 +73,12 @@ class DatabaseService:
             logger.error(f"❌ Email metadata storage failed: {e}")
             raise
     
-    async def get_document_metadata(self, document_id: str) -> Optional[Dict[str, Any]]:
-        """Get document metadata by ID"""
+    async def get_document_metadata(self, document_id: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+        """Get document metadata by ID (only the given columns, if the caller needs few)"""
         try:
-            result = self.client.table(self.table_name).select("*").eq("id", document_id).execute()
+            result = self.client.table(self.table_name).select(columns).eq("id", document_id).execute()
             
-            logger.info(f"Query result for {document_id}: {result.data}")
+            logger.debug(f"Query result for {document_id}: {len(result.data or [])} row(s)")
             
             if result.data and len(result.data) > 0:
                 return result.data[0]
@@ -73,6 +90,56 @@ class DatabaseService:
             logger.error(f"❌ Metadata retrieval failed: {e}")
             raise
     
+    async def get_documents_metadata(self, document_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get metadata for several documents in one query, keyed by document ID"""
+        if not document_ids:
+            return {}
+        
+        try:
+            query = self.client.table(self.table_name).select("*").in_("id", document_ids)
+            result = await asyncio.to_thread(query.execute)
+            
+            return {str(row['id']): row for row in (result.data or [])}
+            
+        except Exception as e:
+            logger.error(f"❌ Batch metadata retrieval failed: {e}")
+            raise
+    
+    async def get_visible_documents_metadata(
+        self,
+        document_ids: List[str],
+        user_email: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Get metadata for several documents in one query, keyed by document ID,
+        leaving out private documents not owned by user_email
+        """
+        documents = await self.get_documents_metadata(document_ids)
+        
+        # Checked here rather than in a PostgREST or= filter: user_email comes straight from
+        # the request, and interpolated into the filter string it could add its own conditions
+        return {
+            document_id: row
+            for document_id, row in documents.items()
+            if not row.get('is_private') or (user_email and row.get('owner_email') == user_email)
+        }
+    
+    async def get_document_by_content_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Find a document with identical file content (indexed on content_hash)"""
+        try:
+            # Select * so task_type is read when its migration has run, without requiring it
+            query = self.client.table(self.table_name)\
+                .select("*")\
+                .eq("content_hash", content_hash)\
+                .limit(1)
+            result = await asyncio.to_thread(query.execute)
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            logger.error(f"❌ Content hash lookup failed: {e}")
+            raise
+    
     async def get_documents_by_department(
         self,
         department: str,
@@ -155,6 +222,26 @@ class DatabaseService:
             logger.error(f"❌ Metadata update failed: {e}")
             raise
     
+    async def get_overview_stats(self) -> Optional[Dict[str, Any]]:
+        """Get document counts aggregated in Postgres (see get_overview_stats in the schema)"""
+        try:
+            result = await asyncio.to_thread(self.client.rpc("get_overview_stats").execute)
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"❌ Overview stats query failed: {e}")
+            raise
+    
+    async def get_department_summary(self, department: str) -> Optional[Dict[str, Any]]:
+        """Get a department's document counts aggregated in Postgres (see get_department_summary in the schema)"""
+        try:
+            result = await asyncio.to_thread(self.client.rpc("get_department_summary", {"dept": department}).execute)
+            return result.data
+            
+        except Exception as e:
+            logger.error(f"❌ Department summary query failed: {e}")
+            raise
+    
     def check_health(self) -> bool:
         """Check if database is accessible"""
         try:
@@ -4,11 +4,16 @@ Uses RAG with LLM to classify documents into departments and generate summaries
 """
 import os
 import logging
-from typing import Dict, Any, List
-from openai import OpenAI
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
+# Number of classification results kept in memory
+CLASSIFICATION_CACHE_SIZE = 256
+
 class DepartmentClassifier:
     
     DEPARTMENTS = [
@@ -22,6 +27,15 @@ class DepartmentClassifier:
         "General"
     ]
     
+    # Prompt fragment listing valid departments, built once per process
+    DEPARTMENTS_LIST = ", ".join(DEPARTMENTS)
+    
+    # Lowercased names for fuzzy matching of LLM output, so they aren't re-lowered per response
+    DEPARTMENTS_LOWER = [(dept.lower(), dept) for dept in DEPARTMENTS]
+    
+    # Case-insensitive exact lookup of the department the LLM named
+    DEPARTMENT_BY_LOWER = {dept_lower: dept for dept_lower, dept in DEPARTMENTS_LOWER}
+    
     def __init__(self):
         # Use OpenRouter API
         api_key = os.getenv("OPENROUTER_API_KEY")
@@ -29,9 +43,13 @@ class DepartmentClassifier:
             raise ValueError("OPENROUTER_API_KEY environment variable is required")
         
         base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
-        self.openai_client = OpenAI(api_key=api_key, base_url=base_url)
+        # Async client so the event loop keeps serving requests during the LLM round-trip
+        self.openai_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
         self.model = os.getenv("OPENROUTER_MODEL", "openai/gpt-4-turbo-preview")
         
+        # LRU of classification results keyed by prompt hash; failed calls are never cached
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        
         logger.info(f"Department classifier initialized with model: {self.model}")
     
     async def initialize(self):
@@ -41,8 +59,8 @@ class DepartmentClassifier:
     async def classify_and_summarize(
         self,
         content: str,
-        embedding: List[float],
-        filename: str
+        filename: str,
+        embedding: Optional[List[float]] = None
     ) -> Dict[str, Any]:
         """
         Use LLM to classify document department and generate summary
@@ -65,8 +83,16 @@ class DepartmentClassifier:
             # Create prompt for LLM
             prompt = self._create_classification_prompt(filename, truncated_content)
             
+            # Identical prompt (same filename and content) was classified recently
+            cache_key = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                logger.info(f"✅ Classification cache hit for {filename}")
+                return dict(cached)
+            
             # Call OpenAI API
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -92,6 +118,11 @@ class DepartmentClassifier:
                 result['reasoning'] = f"Routed to General: Low confidence classification. Original: {result.get('original_department', result['department'])}"
             
             logger.info(f"✅ Classification: {result['department']} (confidence: {result['confidence']})")
+            
+            self._cache[cache_key] = dict(result)
+            if len(self._cache) > CLASSIFICATION_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            
             return result
             
         except Exception as e:
@@ -107,12 +138,10 @@ class DepartmentClassifier:
     def _create_classification_prompt(self, filename: str, content: str) -> str:
         """Create the prompt for LLM classification"""
         
-        departments_list = ", ".join(self.DEPARTMENTS)
-        
         prompt = f"""Analyze the following document and perform two tasks:
 
 1. **Classify the department**: Determine which department this document belongs to from the following list:
-   {departments_list}
+   {self.DEPARTMENTS_LIST}
 
 2. **Generate a summary**: Create a concise 2-3 sentence summary of the document's key content and purpose.
 
@@ -147,14 +176,15 @@ Be precise and ensure the department name exactly matches one from the list."""
                 line = line.strip()
                 if line.startswith("DEPARTMENT:"):
                     dept = line.replace("DEPARTMENT:", "").strip()
+                    dept_lower = dept.lower()
                     # Validate department
-                    if dept in self.DEPARTMENTS:
-                        result["department"] = dept
-                        result["original_department"] = dept  # Store original for low confidence routing
+                    if dept_lower in self.DEPARTMENT_BY_LOWER:
+                        result["department"] = self.DEPARTMENT_BY_LOWER[dept_lower]
+                        result["original_department"] = result["department"]  # Store original for low confidence routing
                     else:
                         # Try to find closest match
-                        for valid_dept in self.DEPARTMENTS:
-                            if valid_dept.lower() in dept.lower():
+                        for valid_dept_lower, valid_dept in self.DEPARTMENTS_LOWER:
+                            if valid_dept_lower in dept_lower:
                                 result["department"] = valid_dept
                                 result["original_department"] = valid_dept
                                 break
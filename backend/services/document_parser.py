@@ -2,21 +2,129 @@
 Document Parser Service
 Extracts text from various document formats
 """
+import os
+import asyncio
 import logging
-from typing import Optional
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from typing import Iterator, List, Optional, Tuple
 import io
 
 # Document processing libraries
 import PyPDF2
-import pdfplumber
+import fitz  # PyMuPDF
 from PIL import Image
 import pytesseract
 from openpyxl import load_workbook
 import docx
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# PDFs longer than this are extracted in worker processes, at least PDF_PAGES_PER_TASK pages at a time.
+# PyMuPDF extracts a dense text page in ~2 ms, while a pool round-trip (pickling the file
+# there, the text back, reopening it per worker) costs 10-30 ms, so the pool only wins
+# from roughly 30 dense pages; 50 leaves a margin for lighter pages
+PDF_PARALLEL_PAGE_THRESHOLD = 50
+PDF_PAGES_PER_TASK = 10
+# os.cpu_count() reports the host's cores, not the container's CPU quota, and every gunicorn
+# worker gets its own pool - so keep this small unless the deployment says otherwise
+PDF_WORKERS = max(1, int(os.getenv("PDF_WORKERS", "2")))
+
+# Resolution scanned PDF pages are rendered at for OCR. Rendering already fixes the size,
+# so these pages skip the OCR_MAX_DIMENSION downscale (it would drop A4 to ~150 dpi)
+PDF_OCR_DPI = 200
+
+# OCR costs seconds per page, and the embedding only reads the first ~30k characters
+# (about ten scanned pages), so later scanned pages aren't worth recognising
+MAX_OCR_PAGES = 10
+
+# Longest side uploaded images are downscaled to before OCR; larger photos only slow
+# Tesseract down without improving recognition at document resolutions
+OCR_MAX_DIMENSION = 1800
+
+# Only the start of a spreadsheet reaches the embedding/classifier (both truncate the
+# text), so don't parse more rows than that
+MAX_TABULAR_ROWS = 1000
+
+# Number of parsed documents kept in memory, keyed by content hash
+PARSE_CACHE_SIZE = 128
+
+# Longest text returned for a document. Embedding reads 30k characters and classification
+# 8k, so this only bounds memory (incl. the parse cache) and the text copied between stages
+MAX_PARSED_CHARS = 200_000
+
+# Body elements of a .docx that carry text
+DOCX_PARAGRAPH_TAG = qn('w:p')
+DOCX_TABLE_TAG = qn('w:tbl')
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Create the PDF worker pool on first use (once per server process)"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        # Forking a multi-threaded server process (the pool is first used from a
+        # to_thread worker) can copy held locks into the child; start from a clean forkserver
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _pdf_pool
+
+def _extract_pdf_page_range(content: bytes, start: int, stop: int) -> List[str]:
+    """Extract text from pages [start, stop) - module level so worker processes can run it"""
+    with fitz.open(stream=content, filetype="pdf") as pdf:
+        return [pdf[page_number].get_text() for page_number in range(start, stop)]
+
+def _choose_pdf_strategy(page_count: int) -> str:
+    """
+    Pick how to extract a PDF's text: 'serial' in this thread, or 'processes' on the pool.
+    Short PDFs aren't worth pickling to a worker, and with a single CPU the pool only adds
+    overhead (PyMuPDF holds the GIL, so threads wouldn't help either).
+    """
+    if page_count <= PDF_PARALLEL_PAGE_THRESHOLD or PDF_WORKERS == 1:
+        return 'serial'
+    return 'processes'
+
+def _ocr_image(image: Image.Image, downscale: bool = True) -> str:
+    """OCR an image in grayscale, first shrinking it to OCR_MAX_DIMENSION unless downscale is False"""
+    if downscale and max(image.size) > OCR_MAX_DIMENSION:
+        image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION), Image.LANCZOS)
+    if image.mode != 'L':
+        image = image.convert('L')
+    return pytesseract.image_to_string(image)
+
+def _ocr_pdf_page_image(image: Optional[Image.Image]) -> str:
+    """OCR one rendered PDF page; a page that fails (or had nothing to render) yields ''"""
+    if image is None:
+        return ""
+    try:
+        # Already rendered at PDF_OCR_DPI in grayscale
+        return _ocr_image(image, downscale=False)
+    except pytesseract.TesseractNotFoundError:
+        raise
+    except Exception as e:
+        logger.warning(f"OCR failed for a PDF page: {e}")
+        return ""
+
+def _row_join(row) -> str:
+    """Flatten a table row to 'a | b | c'; empty cells become '', but 0/False are kept"""
+    return " | ".join("" if value is None else value if type(value) is str else str(value) for value in row)
+
+def calculate_content_hash(content: bytes) -> str:
+    """
+    Fingerprint raw file bytes for duplicate detection and caching.
+    BLAKE2b with a 128-bit digest: fast, and collision-safe for dedup keys.
+    """
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
 class DocumentParser:
     
     SUPPORTED_FORMATS = {
@@ -27,55 +135,96 @@ class DocumentParser:
         'text': ['.txt']
     }
     
-    async def parse_document(self, filename: str, content: bytes) -> str:
+    # Extension -> format lookup, built once instead of scanning every list per document
+    FORMAT_BY_EXTENSION = {
+        extension: file_format
+        for file_format, extensions in SUPPORTED_FORMATS.items()
+        for extension in extensions
+    }
+    
+    def __init__(self):
+        # LRU of extracted text so re-uploads/re-analyses of a file skip extraction
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+    
+    async def parse_document(self, filename: str, content: bytes, content_hash: Optional[str] = None) -> str:
         """
         Parse document based on file type
         Returns extracted text content
+        
+        Pass content_hash when the caller already hashed the bytes, so they aren't hashed twice
         """
+        cache_key = (content_hash or calculate_content_hash(content), filename.lower().split('.')[-1])
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            logger.info(f"✅ Parse cache hit for {filename}")
+            return cached
+        
         try:
-            file_extension = filename.lower().split('.')[-1]
-            
-            if f'.{file_extension}' in self.SUPPORTED_FORMATS['pdf']:
-                return await self._parse_pdf(content)
-            elif f'.{file_extension}' in self.SUPPORTED_FORMATS['docx']:
-                return await self._parse_docx(content)
-            elif f'.{file_extension}' in self.SUPPORTED_FORMATS['excel']:
-                return await self._parse_excel(content, file_extension)
-            elif f'.{file_extension}' in self.SUPPORTED_FORMATS['image']:
-                return await self._parse_image(content)
-            elif f'.{file_extension}' in self.SUPPORTED_FORMATS['text']:
-                return content.decode('utf-8')
-            else:
-                logger.warning(f"Unsupported format: {file_extension}")
-                return f"[Unsupported file format: {file_extension}]"
+            # Extraction is CPU-bound; run it in a worker thread so the event loop
+            # keeps serving other requests meanwhile
+            text = await asyncio.to_thread(self._parse_by_type, filename, content)
                 
         except Exception as e:
             logger.error(f"❌ Parse error for {filename}: {e}", exc_info=True)
             return f"[Error parsing document: {str(e)}]"
+        
+        if len(text) > MAX_PARSED_CHARS:
+            logger.info(f"Truncating {filename} from {len(text)} to {MAX_PARSED_CHARS} characters")
+            text = text[:MAX_PARSED_CHARS] + "\n\n[Content truncated...]"
+        
+        self._cache[cache_key] = text
+        if len(self._cache) > PARSE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        
+        return text
     
-    async def _parse_pdf(self, content: bytes) -> str:
+    def _parse_by_type(self, filename: str, content: bytes) -> str:
+        """Dispatch to the extractor for the file's extension"""
+        file_extension = filename.lower().split('.')[-1]
+        file_format = self.FORMAT_BY_EXTENSION.get(f'.{file_extension}')
+        
+        if file_format == 'pdf':
+            return self._parse_pdf(content)
+        elif file_format == 'docx':
+            return self._parse_docx(content)
+        elif file_format == 'excel':
+            return self._parse_excel(content, file_extension)
+        elif file_format == 'image':
+            return self._parse_image(content)
+        elif file_format == 'text':
+            return content.decode('utf-8')
+        else:
+            logger.warning(f"Unsupported format: {file_extension}")
+            return f"[Unsupported file format: {file_extension}]"
+    
+    def _parse_pdf(self, content: bytes) -> str:
         """Extract text from PDF"""
         try:
-            text_parts = []
-            
-            # Try pdfplumber first (better for tables)
+            # Try PyMuPDF first (native MuPDF parser, far faster than pure-Python ones)
             try:
-                with pdfplumber.open(io.BytesIO(content)) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_parts.append(page_text)
+                with fitz.open(stream=content, filetype="pdf") as pdf:
+                    page_count = pdf.page_count
+                    strategy = _choose_pdf_strategy(page_count)
+                    logger.debug(f"PDF has {page_count} pages, extracting with '{strategy}' strategy")
+                    if strategy == 'serial':
+                        page_texts = [page.get_text() for page in pdf]
+                
+                # Page extraction is CPU-bound, so spread long PDFs across processes
+                if strategy == 'processes':
+                    page_texts = self._extract_pdf_pages_parallel(content, page_count)
             except Exception as e:
-                logger.warning(f"pdfplumber failed, trying PyPDF2: {e}")
+                logger.warning(f"PyMuPDF failed, trying PyPDF2: {e}")
                 
                 # Fallback to PyPDF2
                 pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_parts.append(page_text)
+                page_texts = [page.extract_text() for page in pdf_reader.pages]
+            else:
+                # Born-digital pages are done; only pages without a text layer (scans,
+                # or scanned pages inside an otherwise digital PDF) need OCR
+                self._ocr_blank_pages(content, page_texts)
             
-            extracted_text = "\n\n".join(text_parts)
+            extracted_text = "\n\n".join(page_text for page_text in page_texts if page_text)
             
             if not extracted_text.strip():
                 logger.warning("No text extracted from PDF, might be image-based")
@@ -87,36 +236,83 @@ class DocumentParser:
             logger.error(f"PDF parsing error: {e}")
             raise
     
-    async def _parse_docx(self, content: bytes) -> str:
+    def _extract_pdf_pages_parallel(self, content: bytes, page_count: int) -> List[str]:
+        """Extract the text of every PDF page in batches on the worker pool, preserving page order"""
+        # Every task pickles the whole file and reopens it in the worker, so use one
+        # batch per worker rather than many small ones
+        pages_per_task = max(PDF_PAGES_PER_TASK, -(-page_count // PDF_WORKERS))
+        starts = range(0, page_count, pages_per_task)
+        stops = [min(start + pages_per_task, page_count) for start in starts]
+        
+        batches = _get_pdf_pool().map(_extract_pdf_page_range, repeat(content), starts, stops)
+        
+        return [page_text for batch in batches for page_text in batch]
+    
+    def _ocr_blank_pages(self, content: bytes, page_texts: List[str]) -> None:
+        """Fill in page_texts entries that have no text layer by OCR, keeping the rest if OCR fails"""
+        blank_pages = [page_number for page_number, page_text in enumerate(page_texts) if not page_text.strip()]
+        if len(blank_pages) > MAX_OCR_PAGES:
+            logger.info(f"OCR limited to the first {MAX_OCR_PAGES} of {len(blank_pages)} pages without a text layer")
+            blank_pages = blank_pages[:MAX_OCR_PAGES]
+        if not blank_pages:
+            return
+        
+        logger.info(f"{len(blank_pages)} of {len(page_texts)} PDF pages have no text layer, running OCR")
+        try:
+            for page_number, page_text in zip(blank_pages, self._ocr_pdf_pages(content, blank_pages)):
+                page_texts[page_number] = page_text
+        except Exception as e:
+            # e.g. no tesseract binary on the host - the text layer is still worth returning
+            logger.warning(f"OCR of PDF pages failed, keeping extracted text only: {e}")
+    
+    def _ocr_pdf_pages(self, content: bytes, page_numbers: List[int]) -> List[str]:
+        """OCR the given PDF pages, rendered with PyMuPDF; returns one text per page number"""
+        # PyMuPDF documents aren't thread-safe, so render serially; Tesseract runs as a
+        # subprocess per page, so the OCR itself parallelises fine on threads
+        with fitz.open(stream=content, filetype="pdf") as pdf:
+            images = []
+            for page_number in page_numbers:
+                page = pdf[page_number]
+                # Nothing to recognise on a page with neither text nor images (e.g. blank separators)
+                if not page.get_images():
+                    images.append(None)
+                    continue
+                pixmap = page.get_pixmap(dpi=PDF_OCR_DPI, colorspace=fitz.csGRAY)
+                images.append(Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples))
+        
+        with ThreadPoolExecutor(max_workers=PDF_WORKERS) as executor:
+            return list(executor.map(_ocr_pdf_page_image, images))
+    
+    def _parse_docx(self, content: bytes) -> str:
         """Extract text from DOCX"""
         try:
             doc = docx.Document(io.BytesIO(content))
-            text_parts = []
-            
-            # Extract paragraphs
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text_parts.append(paragraph.text)
-            
-            # Extract tables
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = [cell.text for cell in row.cells]
-                    text_parts.append(" | ".join(row_text))
-            
-            return "\n".join(text_parts)
+            return "\n".join(self._iter_docx_text(doc))
             
         except Exception as e:
             logger.error(f"DOCX parsing error: {e}")
             raise
     
-    async def _parse_excel(self, content: bytes, file_extension: str) -> str:
+    def _iter_docx_text(self, doc) -> Iterator[str]:
+        """Yield non-empty paragraphs and table rows in the order they appear in the document"""
+        for element in doc.element.body.iterchildren():
+            if element.tag == DOCX_PARAGRAPH_TAG:
+                text = Paragraph(element, doc).text
+                if text.strip():
+                    yield text
+            elif element.tag == DOCX_TABLE_TAG:
+                for row in Table(element, doc).rows:
+                    yield _row_join(cell.text for cell in row.cells)
+    
+    def _parse_excel(self, content: bytes, file_extension: str) -> str:
         """Extract text from Excel/CSV"""
         try:
             if file_extension == 'csv':
-                df = pd.read_csv(io.BytesIO(content))
+                df = pd.read_csv(io.BytesIO(content), nrows=MAX_TABULAR_ROWS)
+            elif file_extension == 'xlsx':
+                return self._parse_xlsx(content)
             else:
-                df = pd.read_excel(io.BytesIO(content), sheet_name=None)
+                df = pd.read_excel(io.BytesIO(content), sheet_name=None, nrows=MAX_TABULAR_ROWS)
                 
                 # Combine all sheets
                 if isinstance(df, dict):
@@ -132,11 +328,27 @@ class DocumentParser:
             logger.error(f"Excel parsing error: {e}")
             raise
     
-    async def _parse_image(self, content: bytes) -> str:
+    def _parse_xlsx(self, content: bytes) -> str:
+        """Stream .xlsx rows with openpyxl in read-only mode instead of building DataFrames"""
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        try:
+            all_data = []
+            for sheet in workbook.worksheets:
+                all_data.append(f"Sheet: {sheet.title}")
+                all_data.append("\n".join(
+                    _row_join(row)
+                    for row in sheet.iter_rows(max_row=MAX_TABULAR_ROWS, values_only=True)
+                    if any(value is not None for value in row)
+                ))
+            return "\n\n".join(all_data)
+        finally:
+            workbook.close()
+    
+    def _parse_image(self, content: bytes) -> str:
         """Extract text from image using OCR"""
         try:
             image = Image.open(io.BytesIO(content))
-            text = pytesseract.image_to_string(image)
+            text = _ocr_image(image)
             
             if not text.strip():
                 return "[No text found in image]"
@@ -8,7 +8,7 @@ import logging
 from typing import List, Dict, Any, Optional
 import chromadb
 from chromadb.config import Settings
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
@@ -20,18 +20,11 @@ class EmbeddingService:
             raise ValueError("OPENROUTER_API_KEY environment variable is required")
         
         base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
-        self.openai_client = OpenAI(api_key=api_key, base_url=base_url)
+        self.openai_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
         
-        # Initialize ChromaDB with local path
-        chroma_path = os.path.join(os.path.dirname(__file__), "../chroma_db")
-        os.makedirs(chroma_path, exist_ok=True)
-        self.chroma_client = chromadb.PersistentClient(
-            path=chroma_path,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+        # ChromaDB is opened in initialize() so importing the app doesn't touch the store
+        self.chroma_path = os.path.join(os.path.dirname(__file__), "../chroma_db")
+        self.chroma_client = None
         
         self.collection_name = "documents"
         self.collection = None
@@ -41,6 +34,16 @@ class EmbeddingService:
     async def initialize(self):
         """Initialize or get existing collection"""
         try:
+            if self.chroma_client is None:
+                os.makedirs(self.chroma_path, exist_ok=True)
+                self.chroma_client = chromadb.PersistentClient(
+                    path=self.chroma_path,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        allow_reset=True
+                    )
+                )
+            
             self.collection = self.chroma_client.get_or_create_collection(
                 name=self.collection_name,
                 metadata={"description": "Document embeddings for Doc.X-Intelligent"}
@@ -59,7 +62,7 @@ class EmbeddingService:
             if len(text) > 30000:  # Approximate token limit
                 text = text[:30000]
             
-            response = self.openai_client.embeddings.create(
+            response = await self.openai_client.embeddings.create(
                 model=model,
                 input=text
             )
@@ -117,6 +120,29 @@ class EmbeddingService:
             logger.error(f"❌ Embedding storage failed: {e}")
             raise
     
+    async def get_embedding(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a stored embedding and its metadata by ID
+        Returns None if the ID is not in the collection
+        """
+        try:
+            result = self.collection.get(
+                ids=[document_id],
+                include=["embeddings", "metadatas"]
+            )
+            
+            if not result['ids']:
+                return None
+            
+            return {
+                "embedding": list(result['embeddings'][0]),
+                "metadata": result['metadatas'][0] or {}
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Embedding retrieval failed: {e}")
+            raise
+    
     async def search_similar(
         self,
         query_embedding: List[float],
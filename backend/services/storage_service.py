@@ -3,29 +3,35 @@ Supabase Storage Service for Document Storage
 Handles all object storage operations using Supabase Storage Buckets
 """
 import os
+import asyncio
+import mimetypes
 import logging
 from datetime import timedelta
 from typing import Optional
-from supabase import create_client, Client
+from supabase import Client
 import uuid
 import re
+from .supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
+# Characters stripped from uploaded filenames before they become object paths
+UNSAFE_FILENAME_CHARS = re.compile(r'[^\w\s.-]')
+
+def resolve_content_type(filename: str, content_type: Optional[str] = None) -> str:
+    """Content type to store a file under: the client's, else guessed from the file extension"""
+    # Clients don't always send a content type
+    return content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
 class StorageService:
     def __init__(self):
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
         self.bucket_name = os.getenv("STORAGE_BUCKET", "documents")
         
-        if not supabase_url or not supabase_key:
-            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
-        
-        # Initialize Supabase client
-        self.client: Client = create_client(supabase_url, supabase_key)
+        # Same client (and connection pool) as DatabaseService
+        self.client: Client = get_supabase_client()
         self.storage = self.client.storage
         
-        logger.info(f"✅ Supabase Storage initialized: {supabase_url}")
+        logger.info(f"✅ Supabase Storage initialized: {self.bucket_name}")
     
     async def initialize_buckets(self):
         """Create buckets if they don't exist"""
@@ -51,7 +57,7 @@ class StorageService:
         self,
         filename: str,
         content: bytes,
-        content_type: str = "application/octet-stream"
+        content_type: Optional[str] = None
     ) -> str:
         """
         Upload a document to Supabase Storage
@@ -62,15 +68,18 @@ class StorageService:
             file_id = str(uuid.uuid4())
             
             # Sanitize original filename (remove special characters, keep spaces as underscores)
-            safe_filename = re.sub(r'[^\w\s.-]', '', filename)
+            safe_filename = UNSAFE_FILENAME_CHARS.sub('', filename)
             safe_filename = safe_filename.replace(' ', '_')
             
+            content_type = resolve_content_type(filename, content_type)
+            
             # Store as: uuid/original-filename.ext
             # This preserves original name while ensuring uniqueness
             object_name = f"{file_id}/{safe_filename}"
             
-            # Upload to Supabase Storage
-            result = self.storage.from_(self.bucket_name).upload(
+            # Upload to Supabase Storage (blocking client, so off the event loop)
+            result = await asyncio.to_thread(
+                self.storage.from_(self.bucket_name).upload,
                 path=object_name,
                 file=content,
                 file_options={"content-type": content_type}
@@ -86,7 +95,7 @@ class StorageService:
     async def download_document(self, object_name: str) -> bytes:
         """Download a document from Supabase Storage"""
         try:
-            response = self.storage.from_(self.bucket_name).download(object_name)
+            response = await asyncio.to_thread(self.storage.from_(self.bucket_name).download, object_name)
             return response
             
         except Exception as e:
@@ -100,8 +109,10 @@ class StorageService:
     ) -> str:
         """Generate a signed URL for document download/viewing"""
         try:
-            # Create signed URL with expiry (in seconds)
-            result = self.storage.from_(self.bucket_name).create_signed_url(
+            # Create signed URL with expiry (in seconds); the client is synchronous,
+            # so run it in a worker thread to let callers generate URLs concurrently
+            result = await asyncio.to_thread(
+                self.storage.from_(self.bucket_name).create_signed_url,
                 path=object_name,
                 expires_in=expires
             )
@@ -118,7 +129,7 @@ class StorageService:
     async def delete_document(self, object_name: str):
         """Delete a document from Supabase Storage"""
         try:
-            self.storage.from_(self.bucket_name).remove([object_name])
+            await asyncio.to_thread(self.storage.from_(self.bucket_name).remove, [object_name])
             logger.info(f"✅ Deleted: {object_name}")
             
         except Exception as e:
@@ -0,0 +1,22 @@
+"""
+Supabase Client
+Single Supabase client shared by the storage and database services
+"""
+import os
+import logging
+from functools import lru_cache
+from supabase import create_client, Client
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """Create the Supabase client once per process and reuse it (and its connections) afterwards"""
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_KEY")
+    
+    if not supabase_url or not supabase_key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables are required")
+    
+    logger.info(f"Supabase client created: {supabase_url}")
+    return create_client(supabase_url, supabase_key)
@@ -10,11 +10,13 @@ CREATE TABLE IF NOT EXISTS documents (
     object_path VARCHAR(1000) NOT NULL, -- Path in MinIO
     file_type VARCHAR(100),
     file_size INTEGER,
+    content_hash VARCHAR(32), -- BLAKE2b-128 hex digest of the raw file bytes
     
     -- Classification
     department VARCHAR(100) NOT NULL,
     summary TEXT,
     confidence FLOAT,
+    priority VARCHAR(20) DEFAULT 'normal',
     
     -- Embedding reference
     vector_id VARCHAR(100), -- ChromaDB document ID
@@ -23,6 +25,11 @@ CREATE TABLE IF NOT EXISTS documents (
     source VARCHAR(50) DEFAULT 'manual', -- manual, gmail, sharepoint, etc.
     user_id UUID,
     
+    -- Privacy (private documents are only listed for their owner)
+    is_private BOOLEAN DEFAULT FALSE,
+    owner_email VARCHAR(255),
+    owner_user_id UUID,
+    
     -- Metadata
     upload_date TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
@@ -44,6 +51,14 @@ CREATE TABLE IF NOT EXISTS documents (
     ) STORED
 );
 
+-- Columns added after the first release: CREATE TABLE IF NOT EXISTS leaves an existing
+-- table untouched, so add them explicitly (no-ops on a fresh database)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS priority VARCHAR(20) DEFAULT 'normal';
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS is_private BOOLEAN DEFAULT FALSE;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS owner_email VARCHAR(255);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS owner_user_id UUID;
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_documents_department ON documents(department);
 CREATE INDEX IF NOT EXISTS idx_documents_upload_date ON documents(upload_date DESC);
@@ -52,6 +67,8 @@ CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id);
 CREATE INDEX IF NOT EXISTS idx_documents_vector_id ON documents(vector_id);
 CREATE INDEX IF NOT EXISTS idx_documents_search ON documents USING GIN(search_vector);
 CREATE INDEX IF NOT EXISTS idx_documents_object_path ON documents(object_path);
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash) WHERE content_hash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_documents_department_priority ON documents(department, priority);
 
 -- Updated_at trigger
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -94,6 +111,75 @@ FROM documents
 ORDER BY upload_date DESC
 LIMIT 100;
 
+-- Overview statistics (aggregated server-side for /api/stats/overview)
+CREATE OR REPLACE FUNCTION get_overview_stats()
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'total_documents', (SELECT COUNT(*) FROM documents),
+        'department_priority_counts', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'department', department,
+                'priority', priority,
+                'count', doc_count
+            ))
+            FROM (
+                SELECT department, priority, COUNT(*) AS doc_count
+                FROM documents
+                GROUP BY department, priority
+            ) grouped
+        ), '[]'::jsonb),
+        'recent_uploads_24h', (
+            SELECT COUNT(*) FROM documents
+            WHERE COALESCE(upload_date, created_at) > NOW() - INTERVAL '24 hours'
+        ),
+        'sources', COALESCE((SELECT jsonb_agg(DISTINCT source) FROM documents), '[]'::jsonb),
+        'active_users', (
+            SELECT COUNT(DISTINCT user_id) + COALESCE(MAX(CASE WHEN user_id IS NULL THEN 1 ELSE 0 END), 0)
+            FROM documents
+        )
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Department summary (aggregated server-side for /api/departments/{department}/summary)
+-- Counts public documents only, like the department listing
+CREATE OR REPLACE FUNCTION get_department_summary(dept TEXT)
+RETURNS JSONB AS $$
+    WITH visible AS (
+        SELECT * FROM documents
+        WHERE department = dept AND is_private = FALSE
+    )
+    SELECT jsonb_build_object(
+        'total_documents', (SELECT COUNT(*) FROM visible),
+        'priority_counts', COALESCE((
+            SELECT jsonb_object_agg(priority, doc_count)
+            FROM (
+                SELECT priority, COUNT(*) AS doc_count
+                FROM visible
+                WHERE priority IS NOT NULL
+                GROUP BY priority
+            ) grouped
+        ), '{}'::jsonb),
+        -- status comes from the task migrations, so read it without requiring the column
+        'status_counts', COALESCE((
+            SELECT jsonb_object_agg(status, doc_count)
+            FROM (
+                SELECT to_jsonb(v)->>'status' AS status, COUNT(*) AS doc_count
+                FROM visible v
+                GROUP BY 1
+            ) grouped
+            WHERE status IS NOT NULL
+        ), '{}'::jsonb),
+        'weekly_documents', (
+            SELECT COUNT(*) FROM visible
+            WHERE COALESCE(upload_date, created_at) > NOW() - INTERVAL '7 days'
+        ),
+        'recent_documents', COALESCE((
+            SELECT jsonb_agg(to_jsonb(recent))
+            FROM (SELECT * FROM visible ORDER BY upload_date DESC LIMIT 5) recent
+        ), '[]'::jsonb)
+    );
+$$ LANGUAGE sql STABLE;
+
 -- Search function
 CREATE OR REPLACE FUNCTION search_documents(
     search_query TEXT,
@@ -146,5 +232,6 @@ $$ LANGUAGE plpgsql;
 COMMENT ON TABLE documents IS 'Document metadata storage - actual files stored in MinIO';
 COMMENT ON COLUMN documents.object_path IS 'MinIO object path/key';
 COMMENT ON COLUMN documents.vector_id IS 'Reference to embedding in ChromaDB';
+COMMENT ON COLUMN documents.content_hash IS 'BLAKE2b-128 digest of the original file, used for duplicate detection';
 COMMENT ON COLUMN documents.confidence IS 'LLM classification confidence (0.0-1.0)';
 COMMENT ON COLUMN documents.search_vector IS 'Full-text search vector for filename, summary, department';